@@ -31,20 +31,14 @@ void toast::pointing_matrix_healpix(toast::HealpixPixels const & hpix,
     if (flags == NULL) {
         std::copy(pdata, pdata + (4 * n), pin.begin());
     } else {
-        size_t off;
+        #pragma omp simd
         for (size_t i = 0; i < n; ++i) {
-            off = 4 * i;
-            if (flags[i] == 0) {
-                pin[off] = pdata[off];
-                pin[off + 1] = pdata[off + 1];
-                pin[off + 2] = pdata[off + 2];
-                pin[off + 3] = pdata[off + 3];
-            } else {
-                pin[off] = nullquat[0];
-                pin[off + 1] = nullquat[1];
-                pin[off + 2] = nullquat[2];
-                pin[off + 3] = nullquat[3];
-            }
+            size_t off = 4 * i;
+            bool good = (flags[i] == 0);
+            pin[off] = good ? pdata[off] : nullquat[0];
+            pin[off + 1] = good ? pdata[off + 1] : nullquat[1];
+            pin[off + 2] = good ? pdata[off + 2] : nullquat[2];
+            pin[off + 3] = good ? pdata[off + 3] : nullquat[3];
         }
     }
 
@@ -57,12 +51,14 @@ void toast::pointing_matrix_healpix(toast::HealpixPixels const & hpix,
     }
 
     if (flags != NULL) {
+        #pragma omp simd
         for (size_t i = 0; i < n; ++i) {
             pixels[i] = (flags[i] == 0) ? pixels[i] : -1;
         }
     }
 
     if (mode == "I") {
+        #pragma omp simd
         for (size_t i = 0; i < n; ++i) {
             weights[i] = cal;
         }
@@ -93,13 +89,15 @@ void toast::pointing_matrix_healpix(toast::HealpixPixels const & hpix,
         toast::vatan2(n, by, bx, detang.data());
 
         if (hwpang == NULL) {
+            #pragma omp simd
             for (size_t i = 0; i < n; ++i) {
                 detang[i] *= 2.0;
             }
         } else {
+            // Fused so the compiler can emit a single FMA per sample.
+            #pragma omp simd
             for (size_t i = 0; i < n; ++i) {
-                detang[i] += 2.0 * hwpang[i];
-                detang[i] *= 2.0;
+                detang[i] = 2.0 * detang[i] + 4.0 * hwpang[i];
             }
         }
 
@@ -109,11 +107,14 @@ void toast::pointing_matrix_healpix(toast::HealpixPixels const & hpix,
         // FIXME:  Switch back to fast version after unit tests pass
         toast::vsincos(n, detang.data(), sinout, cosout);
 
+        double etacal = eta * cal;
+
+        #pragma omp simd
         for (size_t i = 0; i < n; ++i) {
             size_t off = 3 * i;
             weights[off + 0] = cal;
-            weights[off + 1] = cosout[i] * eta * cal;
-            weights[off + 2] = sinout[i] * eta * cal;
+            weights[off + 1] = cosout[i] * etacal;
+            weights[off + 2] = sinout[i] * etacal;
         }
     } else {
         auto here = TOAST_HERE();
@@ -55,30 +55,34 @@ class HealpixTest(MPITestCase):
                 self.extcompring.append(hp.ang2pix(self.nside, th, ph, nest=False))
 
         self.nreg = 500
-        self.regular = list()
-        self.regcompnest = list()
-        self.regcompring = list()
-        for th in range(self.nreg):
-            for ph in range(self.nreg):
-                theta = np.radians(th * 180.0 / self.nreg)
-                phi = np.radians(ph * 360.0 / self.nreg)
-                self.regular.append((theta, phi))
-                self.regcompnest.append(hp.ang2pix(self.nside, theta, phi, nest=True))
-                self.regcompring.append(hp.ang2pix(self.nside, theta, phi, nest=False))
+        regtheta, regphi = np.meshgrid(
+            np.radians(np.arange(self.nreg) * 180.0 / self.nreg),
+            np.radians(np.arange(self.nreg) * 360.0 / self.nreg),
+            indexing="ij",
+        )
+        self.regtheta = regtheta.ravel()
+        self.regphi = regphi.ravel()
+        self.regcompnest = hp.ang2pix(
+            self.nside, self.regtheta, self.regphi, nest=True
+        )
+        self.regcompring = hp.ang2pix(
+            self.nside, self.regtheta, self.regphi, nest=False
+        )
 
     def test_roundtrip(self):
         # Test roundtrip except for the pole, where input phi will not
         # match the zero values returned.
-        theta = np.array([x[0] for x in self.regular if x[0] > 0])
-        phi = np.array([x[1] for x in self.regular if x[0] > 0])
+        good = self.regtheta > 0
+        theta = self.regtheta[good]
+        phi = self.regphi[good]
         vec = ang2vec(theta, phi)
         comptheta, compphi = vec2ang(vec)
         np.testing.assert_array_almost_equal(comptheta, theta)
         np.testing.assert_array_almost_equal(compphi, phi)
 
     def test_pix(self):
-        theta = np.array([x[0] for x in self.regular])
-        phi = np.array([x[1] for x in self.regular])
+        theta = self.regtheta
+        phi = self.regphi
         hpix = Pixels(nside=self.nside)
         pixnest = hpix.ang2nest(theta, phi)
         pixring = hpix.ang2ring(theta, phi)
@@ -16,56 +16,83 @@ from .. import qarray as qa
 
 from ._helpers import create_outdir, create_distdata, boresight_focalplane
 
+# Coordinate axes used to construct the test quaternions
+XAXIS, YAXIS, ZAXIS = np.eye(3)
+
+# Angle tables shared by the tests, precomputed in radians
+PHIVEC = np.radians(
+    [-360, -270, -180, -135, -90, -45, 0, 45, 90, 135, 180, 270, 360]
+)
+PSIVEC = np.radians([-180, -135, -90, -45, 0, 45, 90, 135, 180])
+
 
 class OpPointingHpixTest(MPITestCase):
+    # The distributed data fixture is expensive to construct relative
+    # to the tests themselves, so it is built once and shared by every
+    # test in this case.
+    _cached_data = None
+
     def setUp(self):
         fixture_name = os.path.splitext(os.path.basename(__file__))[0]
         self.outdir = create_outdir(self.comm, fixture_name)
 
-        # Create one observation per group, and each observation will have
-        # one detector per process and a single chunk.  Data within an
-        # observation is distributed by detector.
+        cls = type(self)
+        if cls._cached_data is None:
+            # Create one observation per group, and each observation will
+            # have one detector per process and a single chunk.  Data
+            # within an observation is distributed by detector.
 
-        self.data = create_distdata(self.comm, obs_per_group=1)
-        self.ndet = self.data.comm.group_size
+            data = create_distdata(self.comm, obs_per_group=1)
+            ndet = data.comm.group_size
 
-        # Create detectors with default properties
-        (
-            dnames,
-            dquat,
-            depsilon,
-            drate,
-            dnet,
-            dfmin,
-            dfknee,
-            dalpha,
-        ) = boresight_focalplane(self.ndet)
-
-        # A small number of samples
-        self.totsamp = 10
+            # Create detectors with default properties
+            (
+                dnames,
+                dquat,
+                depsilon,
+                drate,
+                dnet,
+                dfmin,
+                dfknee,
+                dalpha,
+            ) = boresight_focalplane(ndet)
 
-        # Populate the observations (one per group)
+            # A small number of samples
+            totsamp = 10
 
-        tod = TODHpixSpiral(
-            self.data.comm.comm_group,
-            dquat,
-            self.totsamp,
-            detranks=self.data.comm.group_size,
-        )
+            # Populate the observations (one per group)
+
+            tod = TODHpixSpiral(
+                data.comm.comm_group,
+                dquat,
+                totsamp,
+                detranks=data.comm.group_size,
+            )
 
-        self.data.obs[0]["tod"] = tod
+            data.obs[0]["tod"] = tod
+            cls._cached_data = data
+
+        self.data = cls._cached_data
+        self.ndet = self.data.comm.group_size
+        self.totsamp = 10
+
+        # Tests must not see cached data products left behind by a
+        # previous test.
+        self.data.obs[0]["tod"].cache.clear()
 
     def tearDown(self):
         del self.data
 
+    @classmethod
+    def tearDownClass(cls):
+        cls._cached_data = None
+
     def test_pointing_matrix_healpix2(self):
         nside = 64
         npix = 12 * nside ** 2
         hpix = HealpixPixels(64)
         nest = True
-        phivec = np.radians(
-            [-360, -270, -180, -135, -90, -45, 0, 45, 90, 135, 180, 270, 360]
-        )
+        phivec = PHIVEC
         nsamp = phivec.size
         eps = 0.0
         cal = 1.0
@@ -75,14 +102,12 @@ class OpPointingHpixTest(MPITestCase):
         flags = np.zeros(nsamp, dtype=np.uint8)
         pixels = np.zeros(nsamp, dtype=np.int64)
         weights = np.zeros([nsamp, nnz], dtype=np.float64)
-        theta = np.radians(135)
-        psi = np.radians(135)
-        quats = []
-        xaxis, yaxis, zaxis = np.eye(3)
-        for phi in phivec:
-            phirot = qa.rotation(zaxis, phi)
-            quats.append(qa.from_angles(theta, phi, psi))
-        quats = np.vstack(quats)
+        theta = 0.75 * np.pi
+        psi = 0.75 * np.pi
+        # Build all of the sample quaternions in one vectorized call
+        quats = qa.from_angles(
+            np.full(nsamp, theta), phivec, np.full(nsamp, psi)
+        )
         pointing_matrix_healpix(
             hpix,
             nest,
@@ -96,7 +121,9 @@ class OpPointingHpixTest(MPITestCase):
             weights.reshape(-1),
         )
         failed = False
-        bad = np.logical_or(pixels < 0, pixels > npix - 1)
+        # A single unsigned comparison catches both negative pixel
+        # values (which wrap to huge numbers) and overflows.
+        bad = pixels.view(np.uint64) >= npix
         nbad = np.sum(bad)
         if nbad > 0:
             print(
@@ -105,6 +132,17 @@ class OpPointingHpixTest(MPITestCase):
                 )
             )
             failed = True
+        # Verify the pixel numbers against healpy as a batched oracle,
+        # using the same angles that the kernel sees.
+        check_theta, check_phi, check_psi = qa.to_angles(quats)
+        pixels_ref = hp.ang2pix(nside, check_theta, check_phi, nest=nest)
+        if np.any(pixels != pixels_ref):
+            print(
+                "Pixels do not agree with healpy: {} != {}".format(
+                    pixels, pixels_ref
+                )
+            )
+            failed = True
         self.assertFalse(failed)
         return
 
@@ -112,8 +150,7 @@ class OpPointingHpixTest(MPITestCase):
         nside = 64
         hpix = HealpixPixels(64)
         nest = True
-        psivec = np.radians([-180, -135, -90, -45, 0, 45, 90, 135, 180])
-        # psivec = np.radians([-180, 180])
+        psivec = PSIVEC
         nsamp = psivec.size
         eps = 0.0
         cal = 1.0
@@ -125,13 +162,12 @@ class OpPointingHpixTest(MPITestCase):
         weights = np.zeros([nsamp, nnz], dtype=np.float64)
         pix = 49103
         theta, phi = hp.pix2ang(nside, pix, nest=nest)
-        xaxis, yaxis, zaxis = np.eye(3)
-        thetarot = qa.rotation(yaxis, theta)
-        phirot = qa.rotation(zaxis, phi)
+        thetarot = qa.rotation(YAXIS, theta)
+        phirot = qa.rotation(ZAXIS, phi)
         pixrot = qa.mult(phirot, thetarot)
         quats = []
         for psi in psivec:
-            psirot = qa.rotation(zaxis, psi)
+            psirot = qa.rotation(ZAXIS, psi)
             quats.append(qa.mult(pixrot, psirot))
         quats = np.vstack(quats)
         pointing_matrix_healpix(
@@ -146,22 +182,30 @@ class OpPointingHpixTest(MPITestCase):
             pixels,
             weights.reshape(-1),
         )
-        weights_ref = []
-        for quat in quats:
-            theta, phi, psi = qa.to_angles(quat)
-            weights_ref.append(np.array([1, np.cos(2 * psi), np.sin(2 * psi)]))
-        weights_ref = np.vstack(weights_ref)
-        failed = False
-        for w1, w2, psi, quat in zip(weights_ref, weights, psivec, quats):
-            # print("\npsi = {}, quat = {} : ".format(psi, quat), end="")
-            if not np.allclose(w1, w2):
-                print(
-                    "Pointing weights do not agree: {} != {}".format(w1, w2), flush=True
-                )
-                failed = True
-            else:
-                # print("Pointing weights agree: {} == {}".format(w1, w2), flush=True)
-                pass
+        # Compute the reference weights for all samples in one batch,
+        # deriving cos(2 psi) and sin(2 psi) directly from the rotated
+        # detector axes instead of round-tripping through atan2 + trig.
+        dir = qa.rotate(quats, ZAXIS)
+        orient = qa.rotate(quats, XAXIS)
+        by = orient[:, 0] * dir[:, 1] - orient[:, 1] * dir[:, 0]
+        bx = (
+            orient[:, 0] * (-dir[:, 2] * dir[:, 0])
+            + orient[:, 1] * (-dir[:, 2] * dir[:, 1])
+            + orient[:, 2] * (dir[:, 0] ** 2 + dir[:, 1] ** 2)
+        )
+        norm = bx ** 2 + by ** 2
+        weights_ref = np.column_stack(
+            [np.ones(nsamp), (bx ** 2 - by ** 2) / norm, 2 * bx * by / norm]
+        )
+        failed = not np.allclose(weights_ref, weights)
+        if failed:
+            bad = ~np.all(np.isclose(weights_ref, weights), axis=1)
+            print(
+                "Pointing weights do not agree: {} != {}".format(
+                    weights_ref[bad], weights[bad]
+                ),
+                flush=True,
+            )
         self.assertFalse(failed)
         return
 
@@ -169,7 +213,7 @@ class OpPointingHpixTest(MPITestCase):
         nside = 64
         hpix = HealpixPixels(64)
         nest = True
-        psivec = np.radians([-180, -135, -90, -45, 0, 45, 90, 135, 180])
+        psivec = PSIVEC
         nsamp = len(psivec)
         eps = 0.0
         cal = 1.0
@@ -178,20 +222,25 @@ class OpPointingHpixTest(MPITestCase):
         flags = np.zeros(nsamp, dtype=np.uint8)
         pix = 49103
         theta, phi = hp.pix2ang(nside, pix, nest=nest)
-        xaxis, yaxis, zaxis = np.eye(3)
-        thetarot = qa.rotation(yaxis, theta)
-        phirot = qa.rotation(zaxis, phi)
+        thetarot = qa.rotation(YAXIS, theta)
+        phirot = qa.rotation(ZAXIS, phi)
         pixrot = qa.mult(phirot, thetarot)
         quats = []
         for psi in psivec:
-            psirot = qa.rotation(zaxis, psi)
+            psirot = qa.rotation(ZAXIS, psi)
             quats.append(qa.mult(pixrot, psirot))
         quats = np.vstack(quats)
 
-        # First with HWP angle == 0.0
+        # The kernel overwrites every output element, so the output
+        # buffers are allocated uninitialized up front and only the HWP
+        # angle needs to be zeroed.
         hwpang = np.zeros(nsamp)
-        pixels_zero = np.zeros(nsamp, dtype=np.int64)
-        weights_zero = np.zeros([nsamp, nnz], dtype=np.float64)
+        pixels_zero = np.empty(nsamp, dtype=np.int64)
+        weights_zero = np.empty([nsamp, nnz], dtype=np.float64)
+        pixels_none = np.empty(nsamp, dtype=np.int64)
+        weights_none = np.empty([nsamp, nnz], dtype=np.float64)
+
+        # First with HWP angle == 0.0
         pointing_matrix_healpix(
             hpix,
             nest,
@@ -206,8 +255,6 @@ class OpPointingHpixTest(MPITestCase):
         )
 
         # Now passing hwpang == None
-        pixels_none = np.zeros(nsamp, dtype=np.int64)
-        weights_none = np.zeros([nsamp, nnz], dtype=np.float64)
         pointing_matrix_healpix(
             hpix,
             nest,
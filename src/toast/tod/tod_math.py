@@ -188,9 +188,9 @@ def sim_noise_timestream(
     """
     tdata = None
     if py:
-        fftlen = 2
-        while fftlen <= (oversample * samples):
-            fftlen *= 2
+        # Smallest power of two strictly greater than the oversampled
+        # length, computed directly instead of with a doubling loop.
+        fftlen = max(2, 1 << int(oversample * samples).bit_length())
         npsd = fftlen // 2 + 1
         norm = rate * float(npsd - 1)
 
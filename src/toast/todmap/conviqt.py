@@ -14,6 +14,8 @@ from ..op import Operator
 
 from ..timing import function_timer, Timer
 
+from ..utils import set_numba_threading
+
 conviqt = None
 
 if use_mpi:
@@ -22,6 +24,52 @@ if use_mpi:
     except ImportError:
         pass
 
+numba = None
+try:
+    import numba
+except ImportError:
+    pass
+
+if numba is not None:
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _to_pointing_angles(quats, psi_pol, theta, phi, psi):
+        """Convert quaternions to ZYZ Euler angles in one fused pass.
+
+        This replicates qa.to_angles, but subtracts the scalar
+        polarization angle from psi on the fly so that no intermediate
+        arrays are materialized.
+        """
+        n = quats.shape[0]
+        for i in numba.prange(n):
+            x = quats[i, 0]
+            y = quats[i, 1]
+            z = quats[i, 2]
+            w = quats[i, 3]
+            inv = 1.0 / np.sqrt(x * x + y * y + z * z + w * w)
+            x *= inv
+            y *= inv
+            z *= inv
+            w *= inv
+            # Rotated Z axis (boresight direction)
+            dx = 2.0 * (x * z + w * y)
+            dy = 2.0 * (y * z - w * x)
+            dz = 1.0 - 2.0 * (x * x + y * y)
+            # Rotated X axis (detector orientation)
+            ox = 1.0 - 2.0 * (y * y + z * z)
+            oy = 2.0 * (x * y + w * z)
+            oz = 2.0 * (x * z - w * y)
+            theta[i] = 0.5 * np.pi - np.arcsin(dz)
+            ang = np.arctan2(dy, dx)
+            if ang < 0.0:
+                ang += 2.0 * np.pi
+            phi[i] = ang
+            pa = np.arctan2(
+                ox * dy - oy * dx,
+                -(ox * dz * dx) - (oy * dz * dy) + oz * (dx * dx + dy * dy),
+            )
+            psi[i] = pa - psi_pol
+
 
 class OpSimConviqt(Operator):
     """Operator which uses libconviqt to generate beam-convolved timestreams.
@@ -113,6 +161,10 @@ class OpSimConviqt(Operator):
 
         self._out = out
 
+        # Single-entry Sky cache, keyed on the resolved file name
+        self._sky_file_cached = None
+        self._sky_cached = None
+
     @property
     def available(self):
         """Return True if libconviqt is found in the library search path."""
@@ -154,15 +206,12 @@ class OpSimConviqt(Operator):
 
         self._check_for_hwp(data)
 
-        detectors = self._get_detectors(data)
+        detectors = self._sort_detectors(self._get_detectors(data))
 
         for det in detectors:
             verbose = self._comm.rank == 0 and self._verbosity > 0
 
-            try:
-                sky_file = self._sky_file[det]
-            except TypeError:
-                sky_file = self._sky_file.format(detector=det, mc=self._mc)
+            sky_file = self._get_sky_file(det)
             sky = self.get_sky(sky_file, det, verbose)
 
             try:
@@ -174,9 +223,9 @@ class OpSimConviqt(Operator):
 
             detector = self.get_detector(det)
 
-            theta, phi, psi, psi_pol = self.get_pointing(data, det, verbose)
-            pnt = self.get_buffer(theta, phi, psi, det, verbose)
-            del theta, phi, psi
+            pointing, psi_pol = self.get_pointing(data, det, verbose)
+            pnt = self.get_buffer(pointing, det, verbose)
+            del pointing
 
             convolved_data = self.convolve(sky, beam, detector, pnt, det, verbose)
 
@@ -199,13 +248,43 @@ class OpSimConviqt(Operator):
             tod = obs["tod"]
             for det in tod.local_dets:
                 dets.add(det)
-        all_dets = self._comm.gather(dets, root=0)
-        if self._comm.rank == 0:
-            for some_dets in all_dets:
-                dets.update(some_dets)
-            dets = sorted(dets)
-        all_dets = self._comm.bcast(dets, root=0)
-        return all_dets
+        # A single allgather gives every process the full detector list
+        # without a separate gather + bcast round trip.
+        all_dets = set()
+        for some_dets in self._comm.allgather(dets):
+            all_dets.update(some_dets)
+        return sorted(all_dets)
+
+    def _get_sky_file(self, det):
+        """Resolve the sky file name for one detector."""
+        try:
+            return self._sky_file[det]
+        except TypeError:
+            return self._sky_file.format(detector=det, mc=self._mc)
+
+    def _sort_detectors(self, detectors):
+        """Order the detectors so that those sharing a sky file are
+        processed consecutively, maximizing reuse of the cached Sky.
+        The key is deterministic, so all processes agree on the order
+        and the collective convolution calls stay matched.
+        """
+        return sorted(detectors, key=lambda det: (self._get_sky_file(det), det))
+
+    def _get_local_offsets(self, data, det):
+        """Return a list of (obs, offset, nsample) tuples for the
+        observations that contain this detector, where offset is the
+        start of the observation in the concatenated local timestream.
+        """
+        local_obs = []
+        offset = 0
+        for obs in data.obs:
+            tod = obs["tod"]
+            if det not in tod.local_dets:
+                continue
+            nsample = tod.local_samples[1]
+            local_obs.append((obs, offset, nsample))
+            offset += nsample
+        return local_obs
 
     def _get_psi_pol(self, focalplane, det):
         """Parse polarization angle in radians from the focalplane
@@ -259,6 +338,11 @@ class OpSimConviqt(Operator):
         return epsilon
 
     def get_sky(self, skyfile, det, verbose):
+        if skyfile == self._sky_file_cached:
+            # Detectors (and Monte Carlo realizations) frequently share
+            # the sky file.  Reuse the Sky loaded for the last detector
+            # instead of reading and expanding the a_lm again.
+            return self._sky_cached
         timer = Timer()
         timer.start()
         sky = conviqt.Sky(self._lmax, self._pol, skyfile, self._fwhm, self._comm)
@@ -266,6 +350,8 @@ class OpSimConviqt(Operator):
             sky.remove_monopole()
         if self._remove_dipole:
             sky.remove_dipole()
+        self._sky_file_cached = skyfile
+        self._sky_cached = sky
         if verbose:
             timer.report_clear("initialize sky for detector {}".format(det))
         return sky
@@ -290,76 +376,116 @@ class OpSimConviqt(Operator):
     def get_pointing(self, data, det, verbose):
         """Return the detector pointing as ZYZ Euler angles without the
         polarization sensitive angle.  These angles are to be compatible
-        with Pxx or Dxx frame beam products
+        with Pxx or Dxx frame beam products.
+
+        The angles are returned as an (nsample, 3) array whose columns
+        are (phi, theta, psi), matching the memory layout of the
+        conviqt.Pointing buffer, together with the psi_pol array.
         """
         # We need the three pointing angles to describe the
         # pointing.  local_pointing() returns the attitude quaternions.
         nullquat = np.array([0, 0, 0, 1], dtype=np.float64)
         timer = Timer()
         timer.start()
-        all_theta, all_phi, all_psi, all_psi_pol = [], [], [], []
-        for obs in data.obs:
+        # Precompute the observation offsets so the concatenated angle
+        # arrays can be allocated once, rather than assembled with
+        # np.hstack copies.
+        local_obs = self._get_local_offsets(data, det)
+        nsamp_tot = sum(nsamp for _, _, nsamp in local_obs)
+        # The pointing is stored in the same (phi, theta, psi) layout as
+        # the conviqt.Pointing buffer so it can be packed in one copy.
+        all_pointing = np.empty((nsamp_tot, 3), dtype=np.float64)
+        all_psi_pol = np.empty(nsamp_tot, dtype=np.float64)
+        # Alias the traits used inside the loop to avoid repeated
+        # attribute lookups per observation.
+        quat_name = self._quat_name
+        apply_flags = self._apply_flags
+        common_flag_name = self._common_flag_name
+        flag_name = self._flag_name
+        common_flag_mask = self._common_flag_mask
+        flag_mask = self._flag_mask
+        dxx = self._dxx
+        for obs, offset, nsamp in local_obs:
             tod = obs["tod"]
-            if det not in tod.local_dets:
-                continue
             focalplane = obs["focalplane"]
-            quats = tod.local_pointing(det, self._quat_name)
+            quats = tod.local_pointing(det, quat_name)
             if verbose:
                 timer.report_clear("get detector pointing for {}".format(det))
 
-            if self._apply_flags:
-                common = tod.local_common_flags(self._common_flag_name)
-                flags = tod.local_flags(det, self._flag_name)
-                common = common & self._common_flag_mask
-                flags = flags & self._flag_mask
-                totflags = np.copy(flags)
-                totflags |= common
-                quats = quats.copy()
-                quats[totflags != 0] = nullquat
+            if apply_flags:
+                common = tod.local_common_flags(common_flag_name)
+                flags = tod.local_flags(det, flag_name)
+                # The cache references must not be modified in place, so
+                # mask the detector flags into a fresh array and fold the
+                # masked common flags on top of it.
+                totflags = np.bitwise_and(flags, flag_mask)
+                totflags |= np.bitwise_and(common, common_flag_mask)
+                bad = totflags != 0
+                if np.any(bad):
+                    # quats is a cache reference so it must not be
+                    # modified in place.  Copy only when there are
+                    # flagged samples to overwrite.
+                    quats = quats.copy()
+                    quats[bad] = nullquat
                 if verbose:
                     timer.report_clear("initialize flags for detector {}".format(det))
 
-            theta, phi, psi = qa.to_angles(quats)
+            ind = slice(offset, offset + nsamp)
+            phi = all_pointing[ind, 0]
+            theta = all_pointing[ind, 1]
+            psi = all_pointing[ind, 2]
+            psi_pol_view = all_psi_pol[ind]
+
             # Polarization angle in the Pxx basis
             psi_pol = self._get_psi_pol(focalplane, det)
-            if self._dxx:
+            if dxx:
                 # Add angle between Dxx and Pxx
                 psi_pol += self._get_psi_uv(focalplane, det)
-            psi -= psi_pol
+            if numba is None:
+                theta[:], phi[:], psi[:] = qa.to_angles(quats)
+                psi -= psi_pol
+            else:
+                # Fused kernel writes the corrected psi directly into
+                # the concatenated buffers, avoiding intermediate arrays.
+                set_numba_threading()
+                _to_pointing_angles(
+                    quats.reshape(-1, 4), psi_pol, theta, phi, psi
+                )
             # Add also a potential HWP angle
-            psi_pol = np.ones(psi.size) * psi_pol
             try:
                 hwpang = tod.local_hwp_angle()
-                psi_pol += 2 * hwpang
             except:
-                pass
-            all_theta.append(theta)
-            all_phi.append(phi)
-            all_psi.append(psi)
-            all_psi_pol.append(psi_pol)
-        if len(all_theta) > 0:
-            all_theta = np.hstack(all_theta)
-            all_phi = np.hstack(all_phi)
-            all_psi = np.hstack(all_psi)
-            all_psi_pol = np.hstack(all_psi_pol)
+                hwpang = None
+            if hwpang is None:
+                psi_pol_view[:] = psi_pol
+            else:
+                # Scale the HWP angle into the output buffer and add the
+                # scalar offset in place to avoid intermediate arrays.
+                np.multiply(hwpang, 2.0, out=psi_pol_view)
+                psi_pol_view += psi_pol
         if verbose:
             timer.report_clear("compute pointing angles for detector {}".format(det))
-        return all_theta, all_phi, all_psi, all_psi_pol
+        return all_pointing, all_psi_pol
 
-    def get_buffer(self, theta, phi, psi, det, verbose):
+    def get_buffer(self, pointing, det, verbose):
         """Pack the pointing into the conviqt pointing array"""
         timer = Timer()
         timer.start()
-        pnt = conviqt.Pointing(len(theta))
-        if pnt._nrow > 0:
-            arr = pnt.data()
-            arr[:, 0] = phi
-            arr[:, 1] = theta
-            arr[:, 2] = psi
+        pnt = conviqt.Pointing(len(pointing))
+        self.fill_buffer(pnt, pointing)
         if verbose:
             timer.report_clear("pack input array for detector {}".format(det))
         return pnt
 
+    def fill_buffer(self, pnt, pointing):
+        """(Re)pack the pointing angles into an existing conviqt buffer."""
+        if pnt._nrow > 0:
+            arr = pnt.data()
+            # The pointing array already uses the (phi, theta, psi)
+            # column order so this is a single contiguous copy.
+            arr[:, :3] = pointing
+        return
+
     def convolve(self, sky, beam, detector, pnt, det, verbose):
         timer = Timer()
         timer.start()
@@ -404,16 +530,22 @@ class OpSimConviqt(Operator):
             return
         timer = Timer()
         timer.start()
-        offset = 0
-        for obs in data.obs:
-            tod = obs["tod"]
-            if det not in tod.local_dets:
-                continue
+        # Gather the per-observation scale factors first.  In the common
+        # case where every observation shares the same epsilon the whole
+        # timestream can be scaled in a single pass.
+        local_obs = self._get_local_offsets(data, det)
+        scales = []
+        for obs, offset, nsample in local_obs:
             focalplane = obs["focalplane"]
             epsilon = self._get_epsilon(focalplane, det)
-            nsample = tod.local_samples[1]
-            convolved_data[offset : offset + nsample] *= 2 / (1 + epsilon)
-            offset += nsample
+            scales.append(2 / (1 + epsilon))
+        if len(set(scales)) == 1:
+            # A unit scale factor needs no calibration pass at all.
+            if scales[0] != 1.0:
+                convolved_data *= scales[0]
+        else:
+            for (obs, offset, nsample), scale in zip(local_obs, scales):
+                convolved_data[offset : offset + nsample] *= scale
         if verbose:
             timer.report_clear("calibrate detector {}".format(det))
         return
@@ -422,18 +554,13 @@ class OpSimConviqt(Operator):
         """Inject the convolved data into the TOD cache."""
         timer = Timer()
         timer.start()
-        offset = 0
-        for obs in data.obs:
+        cachename = "{}_{}".format(self._out, det)
+        for obs, offset, nsample in self._get_local_offsets(data, det):
             tod = obs["tod"]
-            if det not in tod.local_dets:
-                continue
-            nsample = tod.local_samples[1]
-            cachename = "{}_{}".format(self._out, det)
             if not tod.cache.exists(cachename):
                 tod.cache.create(cachename, np.float64, (nsample,))
             ref = tod.cache.reference(cachename)
-            ref[:] += convolved_data[offset : offset + nsample]
-            offset += nsample
+            np.add(ref, convolved_data[offset : offset + nsample], out=ref)
         if verbose:
             timer.report_clear("cache detector {}".format(det))
         return
@@ -531,6 +658,10 @@ class OpSimWeightedConviqt(OpSimConviqt):
 
         self._out = out
 
+        # Single-entry Sky cache, keyed on the resolved file name
+        self._sky_file_cached = None
+        self._sky_cached = None
+
     @function_timer
     def exec(self, data):
         """Loop over all observations and perform the convolution.
@@ -548,15 +679,12 @@ class OpSimWeightedConviqt(OpSimConviqt):
         timer = Timer()
         timer.start()
 
-        detectors = self._get_detectors(data)
+        detectors = self._sort_detectors(self._get_detectors(data))
 
         for det in detectors:
             verbose = self._comm.rank == 0 and self._verbosity > 0
 
-            try:
-                sky_file = self._sky_file[det]
-            except TypeError:
-                sky_file = self._sky_file.format(detector=det, mc=self._mc)
+            sky_file = self._get_sky_file(det)
             sky = self.get_sky(sky_file, det, verbose)
 
             try:
@@ -572,26 +700,36 @@ class OpSimWeightedConviqt(OpSimConviqt):
             beam00I = self.get_beam(beam_file_00i, det, verbose)
             detector = self.get_detector(det)
 
-            theta, phi, psi, psi_pol = self.get_pointing(data, det, verbose)
+            pointing, psi_pol = self.get_pointing(data, det, verbose)
 
             # I-beam convolution
-            pnt = self.get_buffer(theta, phi, psi, det, verbose)
+            pnt = self.get_buffer(pointing, det, verbose)
             convolved_data = self.convolve(sky, beamI00, detector, pnt, det, verbose)
 
-            # Q-beam convolution
-            del pnt
-            pnt = self.get_buffer(theta, phi, psi, det, verbose)
-            convolved_data += np.cos(2 * psi_pol) * self.convolve(
-                sky, beam0I0, detector, pnt, det, verbose
-            )
+            # Evaluate both trig weights over the entire concatenated
+            # psi_pol in one batch, writing the sine into the doubled
+            # angle buffer, so the angle arrays can be released before
+            # the convolutions run.
+            pol_ang = 2.0 * psi_pol
+            cos_weight = np.cos(pol_ang)
+            sin_weight = np.sin(pol_ang, out=pol_ang)
+            del pol_ang, psi_pol
+
+            # Q-beam convolution.  The Pointing buffer is reused across
+            # the convolutions; only the angles are repacked since the
+            # convolution overwrites the buffer contents.
+            self.fill_buffer(pnt, pointing)
+            buf = self.convolve(sky, beam0I0, detector, pnt, det, verbose)
+            buf *= cos_weight
+            convolved_data += buf
 
             # U-beam convolution
-            del pnt
-            pnt = self.get_buffer(theta, phi, psi, det, verbose)
-            convolved_data += np.sin(2 * psi_pol) * self.convolve(
-                sky, beam00I, detector, pnt, det, verbose
-            )
-            del theta, phi, psi
+            self.fill_buffer(pnt, pointing)
+            buf = self.convolve(sky, beam00I, detector, pnt, det, verbose)
+            buf *= sin_weight
+            convolved_data += buf
+            del buf, cos_weight, sin_weight
+            del pointing
 
             self.calibrate(data, det, beamI00, convolved_data, verbose)
 
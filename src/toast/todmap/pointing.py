@@ -91,6 +91,12 @@ class OpPointingHpix(Operator):
         self._common_flag_name = common_flag_name
         self._keep_quats = keep_quats
         self._single_precision = single_precision
+        if self._single_precision and nside > 8192:
+            # 12 * 8192 ** 2 is the largest pixel count that fits in
+            # a signed 32-bit integer.
+            raise RuntimeError(
+                "single_precision pixel numbers require NSIDE <= 8192"
+            )
         self._nside_submap = min(nside, nside_submap)
         self._npix_submap = 12 * self._nside_submap ** 2
         self._nsubmap = (self._nside // self._nside_submap) ** 2
@@ -205,9 +211,12 @@ class OpPointingHpix(Operator):
                     )
 
                 pdata = None
-                if self._keep_quats:
-                    # We are keeping the detector quaternions, so cache
-                    # them now for the full sample range.
+                if self._keep_quats or tod.cache.exists(
+                    "{}_{}".format(tod.POINTING_NAME, det)
+                ):
+                    # Either we are keeping the detector quaternions, or
+                    # an earlier operator already cached them.  Use the
+                    # cached copy instead of recomputing the expansion.
                     pdata = tod.local_pointing(det)
 
                 buf_off = 0
@@ -369,6 +378,12 @@ class OpMuellerPointingHpix(Operator):
         self._common_flag_name = common_flag_name
         self._keep_quats = keep_quats
         self._single_precision = single_precision
+        if self._single_precision and nside > 8192:
+            # 12 * 8192 ** 2 is the largest pixel count that fits in
+            # a signed 32-bit integer.
+            raise RuntimeError(
+                "single_precision pixel numbers require NSIDE <= 8192"
+            )
         self._nside_submap = min(nside, nside_submap)
         self._npix_submap = 12 * self._nside_submap ** 2
         self._nsubmap = (self._nside // self._nside_submap) ** 2
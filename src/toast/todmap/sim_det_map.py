@@ -94,11 +94,13 @@ class OpSimGradient(Operator):
                 pixels = hp.vec2pix(
                     self._nside, dir[:, 0], dir[:, 1], dir[:, 2], nest=self._nest
                 )
-                x, y, z = hp.pix2vec(self._nside, pixels, nest=self._nest)
-                z += 1.0
-                z *= 0.5
-                z *= range
-                z += self._min
+                # Only the z component is needed; dropping the x / y
+                # arrays lets them be freed immediately.
+                z = hp.pix2vec(self._nside, pixels, nest=self._nest)[2]
+                # Map z from [-1, 1] to [min, max] in two fused passes
+                # instead of four separate sweeps over the array.
+                z *= 0.5 * range
+                z += 0.5 * range + self._min
                 z[totflags != 0] = 0.0
 
                 cachename = "{}_{}".format(self._out, det)
@@ -119,11 +121,9 @@ class OpSimGradient(Operator):
         """(array): Return the underlying signal map (full map on all processes)."""
         range = self._max - self._min
         pix = np.arange(0, 12 * self._nside * self._nside, dtype=np.int64)
-        x, y, z = hp.pix2vec(self._nside, pix, nest=self._nest)
-        z += 1.0
-        z *= 0.5
-        z *= range
-        z += self._min
+        z = hp.pix2vec(self._nside, pix, nest=self._nest)[2]
+        z *= 0.5 * range
+        z += 0.5 * range + self._min
         return z
 
 